@@ -0,0 +1,182 @@
+import asyncio
+import hmac
+import json
+import logging
+from collections import deque
+from aiohttp import web
+from aiostream import stream
+from decouple import config
+
+API_HOST = config('API_HOST', default='127.0.0.1')
+API_PORT = config('API_PORT', cast=int)
+API_TOKEN = config('API_TOKEN', default=None)
+API_EVENT_BUFFER = config('API_EVENT_BUFFER', default=1000, cast=int)
+API_KEEPALIVE = 15
+
+
+class EventRing(object):
+    """
+    In-memory ring of recent events, ids are used as resume cursor.
+
+    Attributes
+    ----------
+    size: int
+        number of events kept
+    last_id: int
+        id of the most recent event
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.events = deque(maxlen=size)
+        self.last_id = 0
+        self._new_event = asyncio.Condition()
+
+    async def put(self, kind, data):
+        self.last_id += 1
+        self.events.append((self.last_id, kind, data))
+        async with self._new_event:
+            self._new_event.notify_all()
+
+    def since(self, cursor):
+        """
+        Events newer than cursor, oldest first
+        """
+        return [e for e in self.events if e[0] > cursor]
+
+    async def wait(self, cursor, timeout):
+        """
+        Waits for events newer than cursor, returns False on timeout
+        """
+        async with self._new_event:
+            try:
+                await asyncio.wait_for(
+                    self._new_event.wait_for(lambda: self.last_id > cursor),
+                    timeout
+                    )
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+
+async def api_server(cameras, bases):
+    """
+    Serves SSE event stream, status and control over HTTP
+    """
+    devices = {d.name: d for d in cameras + bases}
+    ring = EventRing(API_EVENT_BUFFER)
+
+    app = web.Application(middlewares=[check_token])
+    app['devices'] = devices
+    app['ring'] = ring
+    app.add_routes([
+        web.get('/events', events),
+        web.get('/status', status),
+        web.post('/control/{name}', control)
+        ])
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, API_HOST, API_PORT).start()
+    logging.info(f"API listening on {API_HOST}:{API_PORT}")
+    if not API_TOKEN and API_HOST not in ['127.0.0.1', '::1', 'localhost']:
+        logging.warning("API is reachable from the network without API_TOKEN")
+
+    try:
+        await asyncio.gather(
+            motion_feed(ring, cameras),
+            status_feed(ring, cameras + bases)
+            )
+    finally:
+        await runner.cleanup()
+
+
+@web.middleware
+async def check_token(request, handler):
+    """
+    Requires "Authorization: Bearer <API_TOKEN>" if a token is set
+    """
+    if API_TOKEN and not hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(),
+        f"Bearer {API_TOKEN}".encode()
+    ):
+        raise web.HTTPUnauthorized(text="Invalid or missing token")
+    return await handler(request)
+
+
+async def motion_feed(ring, cameras):
+    """
+    Merge motion events from all cameras into the event ring
+    """
+    motion_states = stream.merge(*[c.listen_motion() for c in cameras])
+    async with motion_states.stream() as streamer:
+        async for name, motion in streamer:
+            await ring.put('motion', {"name": name, "motion": motion})
+
+
+async def status_feed(ring, devices):
+    """
+    Merge device status from all devices into the event ring
+    """
+    statuses = stream.merge(*[d.listen_status() for d in devices])
+    async with statuses.stream() as streamer:
+        async for name, status in streamer:
+            await ring.put('status', {"name": name, "status": status})
+
+
+async def events(request):
+    """
+    SSE stream of motion and status events. Resumes after the id in
+    Last-Event-ID header or 'since' query parameter.
+    """
+    ring = request.app['ring']
+    try:
+        cursor = int(request.headers.get(
+            'Last-Event-ID', request.query.get('since', ring.last_id)
+            ))
+    except ValueError:
+        raise web.HTTPBadRequest(text="Invalid event id")
+
+    # Cursor from before a restart, everything in the ring is new
+    if cursor > ring.last_id:
+        cursor = 0
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache'
+        })
+    await response.prepare(request)
+
+    try:
+        while True:
+            for event_id, kind, data in ring.since(cursor):
+                await response.write(
+                    f"id: {event_id}\nevent: {kind}\n"
+                    f"data: {json.dumps(data)}\n\n".encode()
+                    )
+                cursor = event_id
+            if not await ring.wait(cursor, API_KEEPALIVE):
+                await response.write(b": keepalive\n\n")
+    except ConnectionResetError:
+        pass
+    return response
+
+
+async def status(request):
+    """
+    Current status of all devices
+    """
+    return web.json_response({
+        name: d.get_status() for name, d in request.app['devices'].items()
+        })
+
+
+async def control(request):
+    """
+    Passes payload to device, same format as MQTT control
+    """
+    device = request.app['devices'].get(request.match_info['name'])
+    if not device:
+        raise web.HTTPNotFound(text="Unknown device")
+    asyncio.create_task(device.mqtt_control(await request.text()))
+    return web.Response(status=202)
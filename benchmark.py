@@ -0,0 +1,161 @@
+"""
+Benchmarks for arlo-streamer, run without arlo account or cameras.
+
+    python benchmark.py loop   Compares event loop implementations
+    python benchmark.py audio  Compares cpu cost of audio modes (ffmpeg)
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from device import Device
+from monitor import LoopMonitor, install_loop
+
+
+class FakeArlo(object):
+    """
+    Minimal stand-in for a pyaarlo device
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.callbacks = []
+
+    def add_attr_callback(self, attr, cb):
+        self.callbacks.append(cb)
+
+
+class BenchDevice(Device):
+    def __init__(self, arlo_device, status_interval):
+        super().__init__(arlo_device, status_interval)
+        self.events = 0
+        self.state = 'idle'
+
+    async def on_event(self, attr, value):
+        self.events += 1
+        self.state = 'streaming' if value else 'idle'
+        self._state_event.set()
+
+    def get_status(self):
+        return {"state": self.state, "events": self.events}
+
+
+def produce(arlo, rate, duration):
+    """
+    Emits attribute callbacks from a separate thread, like pyaarlo does
+    """
+    end = time.monotonic() + duration
+    i = 0
+    while time.monotonic() < end:
+        for cb in arlo.callbacks:
+            cb(arlo, 'motionDetected', i % 2 == 0)
+        i += 1
+        time.sleep(1 / rate)
+
+
+async def consume_status(device):
+    async for _ in device.listen_status():
+        pass
+
+
+async def loop_workload(cameras, rate, duration):
+    monitor = LoopMonitor(report_interval=duration * 2)
+    asyncio.create_task(monitor.run())
+
+    devices = [BenchDevice(FakeArlo(f"cam{i}"), 0.05)
+               for i in range(cameras)]
+    tasks = [asyncio.create_task(d.run()) for d in devices]
+    tasks += [asyncio.create_task(consume_status(d)) for d in devices]
+    # Let callbacks register before producing
+    await asyncio.sleep(0.1)
+
+    cpu = time.process_time()
+    threads = [threading.Thread(target=produce,
+                                args=(d._arlo, rate, duration))
+               for d in devices]
+    [t.start() for t in threads]
+    await asyncio.get_running_loop().run_in_executor(
+        None, lambda: [t.join() for t in threads]
+        )
+    cpu = time.process_time() - cpu
+
+    monitor.stop()
+    for t in tasks:
+        t.cancel()
+    events = sum(d.events for d in devices)
+    return {
+        "events/s": round(events / duration),
+        "cpu_s": round(cpu, 2),
+        **monitor.get_stats()
+        }
+
+
+def bench_loop(args):
+    for impl in ['asyncio', 'uvloop']:
+        if install_loop(impl) != impl:
+            print(f"{impl}: not installed, skipped")
+            continue
+        result = asyncio.run(
+            loop_workload(args.cameras, args.rate, args.duration)
+            )
+        print(f"{impl}: " + ", ".join(f"{k} {v}" for k, v in result.items()))
+    asyncio.set_event_loop_policy(None)
+
+
+def bench_audio(args):
+    """
+    Remuxes a synthetic h264/aac source like the live stream does,
+    once per audio mode, and reports ffmpeg cpu time.
+    """
+    from camera import Camera
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.ts')
+        subprocess.run(
+            ['ffmpeg', '-v', 'error',
+             '-f', 'lavfi', '-i', 'testsrc=size=1280x720:rate=24',
+             '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=16000',
+             '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac',
+             '-t', str(args.duration), '-f', 'mpegts', '-y', source],
+            check=True
+            )
+
+        for mode in Camera.AUDIO_MODES:
+            camera = Camera.__new__(Camera)
+            camera.audio, camera.audio_mode = ('aac', '16000', '1'), mode
+            before = resource.getrusage(resource.RUSAGE_CHILDREN)
+            subprocess.run(
+                ['ffmpeg', '-v', 'error', '-i', source, '-c:v', 'copy',
+                 *camera._audio_args(),
+                 '-bsf', 'dump_extra', '-f', 'mpegts', 'pipe:'],
+                stdout=subprocess.DEVNULL, check=True
+                )
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu = (after.ru_utime - before.ru_utime
+                   + after.ru_stime - before.ru_stime)
+            print(f"{mode}: cpu {cpu:.2f}s for {args.duration}s of stream "
+                  f"({cpu / args.duration * 100:.1f}% of a core)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    loop = sub.add_parser('loop', help='compare event loop implementations')
+    loop.add_argument('--cameras', type=int, default=8)
+    loop.add_argument('--rate', type=int, default=200,
+                      help='events per second per camera')
+    loop.add_argument('--duration', type=int, default=10)
+    loop.set_defaults(func=bench_loop)
+
+    audio = sub.add_parser('audio', help='compare cpu cost of audio modes')
+    audio.add_argument('--duration', type=int, default=60,
+                       help='length of synthetic stream (seconds)')
+    audio.set_defaults(func=bench_audio)
+
+    args = parser.parse_args()
+    args.func(args)
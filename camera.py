@@ -1,12 +1,14 @@
 import subprocess
 import logging
 import asyncio
+import fcntl
 import shlex
 import os
 import re
+import time
 from device import Device
 from decouple import config
-from utils import download_file
+from utils import StreamBudget, ProcessAccounting
 
 DEBUG = config('DEBUG', default=False, cast=bool)
 
@@ -21,10 +23,29 @@ class Camera(Device):
         ffmpeg output string
     timeout: int
         motion timeout of live stream (seconds)
+    watch_recheck: int
+        liveness checks of an external stream between viewer rechecks
     status_interval: int
         interval of status messages from generator (seconds)
     stream: asyncio.subprocess.Process
         current ffmpeg stream (idle or active)
+    http_client: utils.HttpClient
+        shared http client, used for fetching last image
+    budget: utils.StreamBudget
+        live streaming budget, caps motion triggered streaming
+    processes: utils.ProcessAccounting
+        cpu and memory usage of ffmpeg children per role
+    ffmpeg_affinity: dict
+        cpu set per role (proxy, idle, live, encode, probe)
+    ffmpeg_nice: dict
+        nice level per role
+    audio_mode: str
+        audio policy of live and idle stream (see AUDIO_MODES)
+    snapshot_interval: int
+        time between keyframes sampled from live stream for snapshots
+        (seconds, 0 disables)
+    prewarmer: prewarm.Prewarmer
+        prewarms streams of adjacent cameras on motion (optional)
     """
 
     # Possible states
@@ -32,59 +53,130 @@ class Camera(Device):
         'idle',
         'streaming',  # arlo-streamer initiated the stream
         'watching',  # someone else initiated the stream
+        'unavailable',  # camera offline, turned off or battery depleted
         ]
 
-    def __init__(self, arlo_camera, ffmpeg_out,
-                 motion_timeout, status_interval, last_image_idle,
-                 default_resolution, watch_refresh_time):
+    # Audio policies
+    AUDIO_MODES = [
+        'copy',  # keep source audio as is
+        'aac',  # copy if source is aac, otherwise transcode to aac
+        'transcode',  # transcode to mp3
+        'drop',  # no audio
+        ]
+
+    # Encoders for idle audio, matching source codec
+    AUDIO_ENCODERS = {
+        'aac': 'aac',
+        'mp3': 'libmp3lame',
+        'opus': 'libopus',
+        }
+
+    def __init__(self, arlo_camera, *, ffmpeg_out, motion_timeout,
+                 status_interval, last_image_idle, default_resolution,
+                 watch_recheck, watch_refresh_time, stream_budget,
+                 audio_mode, audio_modes, snapshot_interval,
+                 ffmpeg_affinity, ffmpeg_nice, resource_interval,
+                 http_client, prewarmer=None):
         super().__init__(arlo_camera, status_interval)
+        # Pipelines
         self.ffmpeg_out = shlex.split(ffmpeg_out.format(name=self.name))
-        self.timeout = motion_timeout
-        self.last_image_idle = last_image_idle
-        self.watch_refresh_time = watch_refresh_time
-        self._timeout_task = None
-        self.motion = False
-        self._state = None
-        self._motion_event = asyncio.Event()
         self.stream = None
         self.proxy_stream = None
+        self._proxy_restart = False
         self.proxy_reader, self.proxy_writer = os.pipe()
-        self._pictures = asyncio.Queue()
-        self._listen_pictures = False
+        self.last_image_idle = last_image_idle
+        self.http_client = http_client
+        self.idle_video = None
+        self._idle_generation = 0
         self._default_resolution = default_resolution
         self.resolution = None
-        self.idle_video = None
+        self.resolution_probed = False
+        self._audio_mode, self._audio_modes = audio_mode, audio_modes
+        self.audio_mode = self._resolve_audio_mode(audio_mode, audio_modes)
+        self.audio = None
+        self.ready = asyncio.Event()
+
+        # State and motion
+        self._state = None
+        self._available_event = asyncio.Event()
+        self.motion = False
+        self._motion_event = asyncio.Event()
+        self.timeout = motion_timeout
+        self._timeout_task = None
+        self._watch_task = None
+        self.watch_recheck = watch_recheck
+        self.watch_refresh_time = watch_refresh_time
+        self.avoided_teardowns = 0
+        self.budget = StreamBudget(stream_budget)
+        self._budget_task = None
+        self._motion_stream = False
+
+        # Pictures
+        self._pictures = asyncio.Queue()
+        self._listen_pictures = False
+        self.snapshot_interval = snapshot_interval
+        self._live_frame = None
+
+        # Prewarming
+        self.prewarmer = prewarmer
+        self._prewarmed = None
+        self._prewarm_ignore = False
+        self._prewarm_used = asyncio.Event()
+        self._prewarm_used_at = None
+
+        # ffmpeg process tuning and accounting
+        self.ffmpeg_affinity = ffmpeg_affinity
+        self.ffmpeg_nice = ffmpeg_nice
+        self.resource_interval = resource_interval
+        self.processes = ProcessAccounting()
         logging.info(f"Camera added: {self.name}")
 
     async def run(self):
         """
-        Starts the camera, waits indefinitely for camera to become available.
+        Starts the camera once it becomes available.
         Creates event channel between pyaarlo callbacks and async generator.
         Listens for and passes events to handler.
         """
-        while (
-            self._arlo.is_unavailable
-            or (self._arlo.has_batteries and self._arlo.battery_level == 0)
-            or not self._arlo.is_on
-        ):
-            await asyncio.sleep(5)
+        if self._is_available():
+            self._available_event.set()
+        asyncio.create_task(self._start_pipelines())
+        if self.resource_interval:
+            asyncio.create_task(self._resource_monitor())
+        await super().run()
+
+    async def _start_pipelines(self):
+        """
+        Waits for camera to become available, then probes resolution
+        and starts idle and proxy stream.
+        """
+        await self._available_event.wait()
         logging.info(f"{self.name} availaible, starting stream")
 
-        # Start stream to get resolution
-        await self._start_stream()
-        self.stop_stream()
+        # Start stream to get resolution and audio, unless known from last run
+        if not self.resolution or not self.audio:
+            await self._start_stream()
+            self.stop_stream()
 
         await self.set_state('idle')
         asyncio.create_task(self._start_proxy_stream())
-        await super().run()
+        self.ready.set()
+
+        # Availability may have changed during startup
+        await self.on_availability()
 
     # Distributes events to correct handler
     async def on_event(self, attr, value):
+        # Pipelines not started yet, only track availability
+        if self.get_state() is None and attr in ['motionDetected',
+                                                 'activityState']:
+            return
         match attr:
             case 'motionDetected':
                 await self.on_motion(value)
             case 'activityState':
                 await self.on_arlo_state(value)
+            case 'connectionState' | 'batteryLevel' | 'privacyActive':
+                await self.on_availability()
             case 'presignedLastImageData':
                 if self._listen_pictures:
                     self.put_picture(value)
@@ -101,12 +193,20 @@ class Camera(Device):
         self._motion_event.set()
         logging.info(f"{self.name} motion: {motion}")
         if motion:
-            await self.set_state('streaming')
+            if self.prewarmer:
+                self.prewarmer.on_motion(self)
+            # Already streaming, to someone else or started manually
+            if self.get_state() in ['watching', 'streaming']:
+                return
+            if self._budget_exhausted():
+                logging.info(f"{self.name}: streaming budget exhausted")
+                return
+            await self._start_motion_stream()
 
         else:
             if self._timeout_task:
                 self._timeout_task.cancel()
-            if not motion:
+            if self.get_state() == 'streaming':
                 self._timeout_task = asyncio.create_task(
                     self._stream_timeout()
                     )
@@ -122,36 +222,133 @@ class Camera(Device):
                     await self._start_stream()
 
                 case 'watching':
-                    await self.set_state('idle')
+                    await self._leave_watching()
+
+        # Caused by our own prewarm request, anything after is someone else
+        elif state == 'userStreamActive' and self._prewarm_ignore:
+            self._prewarm_ignore = False
 
         elif state == 'userStreamActive' and self.get_state() != 'streaming':
             await self.set_state('watching')
 
+    def can_prewarm(self):
+        return (
+            self.get_state() == 'idle'
+            and not self._prewarmed
+            and not self._budget_exhausted()
+        )
+
+    async def prewarm(self, ttl):
+        """
+        Requests stream ahead of motion and holds it for ttl seconds,
+        used by _start_stream if motion follows, otherwise released.
+        The camera is awake meanwhile, so this counts against the budget.
+
+            Returns:
+                (hit, setup_time), None if no stream was prewarmed
+        """
+        start = time.monotonic()
+        self.budget.start()
+        self._prewarm_ignore = True
+        self._prewarm_used.clear()
+        # Future of the request, motion during setup awaits it as well
+        self._prewarmed = self.event_loop.run_in_executor(
+            None, self._arlo.get_stream
+            )
+        try:
+            stream = await self._prewarmed
+            ready = time.monotonic()
+            if not stream:
+                return None
+
+            if not self._prewarm_used.is_set():
+                if self.get_state() != 'idle':
+                    return None
+                logging.debug(
+                    f"{self.name}: stream prewarmed in {ready - start:.1f}s"
+                    )
+                try:
+                    await asyncio.wait_for(self._prewarm_used.wait(), ttl)
+                except asyncio.TimeoutError:
+                    self._prewarmed = None
+                    # Keep the stream if a viewer started watching meanwhile
+                    if self.get_state() == 'idle':
+                        await self.event_loop.run_in_executor(
+                            None, self._arlo.stop_activity
+                            )
+                    return False, ready - start
+            # Setup time saved, up to the point the stream was needed
+            return True, min(self._prewarm_used_at, ready) - start
+        finally:
+            self._prewarmed = None
+            self._prewarm_ignore = False
+            # A motion stream using it keeps the budget running
+            if self.get_state() != 'streaming' or not self._motion_stream:
+                self.budget.stop()
+
+    async def on_availability(self):
+        """
+        Handles changes in connection, battery and privacy state.
+        Pauses pipelines when unavailable, resumes when available.
+        """
+        if self._is_available():
+            self._available_event.set()
+            if self.get_state() == 'unavailable':
+                await self.set_state('idle')
+        else:
+            self._available_event.clear()
+            if self.get_state() not in [None, 'unavailable']:
+                await self.set_state('unavailable')
+
+    def _is_available(self):
+        return not (
+            self._arlo.is_unavailable
+            or (self._arlo.has_batteries and self._arlo.battery_level == 0)
+            or not self._arlo.is_on
+        )
+
     # Set state in accordance to STATES
     async def set_state(self, new_state):
+        # Only leave unavailable when camera is available again
+        if (
+            self._state == 'unavailable'
+            and not self._available_event.is_set()
+        ):
+            return
         if new_state in self.STATES and new_state != self._state:
-            self._state = new_state
+            old_state, self._state = self._state, new_state
             logging.info(f"{self.name} state: {new_state}")
-            await self._on_state_change(new_state)
+            await self._on_state_change(new_state, old_state)
 
     def get_state(self):
         return self._state
 
     # Handle internal state change, stop or start stream
-    async def _on_state_change(self, new_state):
+    async def _on_state_change(self, new_state, old_state):
         self._state_event.set()
+        if old_state == 'watching' and self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
+        if old_state == 'streaming':
+            self._stop_budget()
+
         match new_state:
-            case 'idle':
-                self.stop_stream()
-                asyncio.create_task(self._start_idle_stream())
+            case 'idle' | 'unavailable':
+                # Idle stream is already running between these two
+                if old_state not in ['idle', 'unavailable']:
+                    self.stop_stream()
+                    asyncio.create_task(self._start_idle_stream())
 
             case 'streaming':
+                # Only motion triggered streaming counts against the budget
+                if self._motion_stream:
+                    self.budget.start()
                 await self._start_stream()
 
             case 'watching':
                 await self._start_stream(self._arlo.get_stream_url)
-                self._timeout_task = asyncio.create_task(
-                    self._watch_timeout()
+                self._watch_task = asyncio.create_task(
+                    self._watch_liveness()
                     )
 
     async def _start_proxy_stream(self):
@@ -161,7 +358,9 @@ class Camera(Device):
         """
         exit_code = 1
         while exit_code > 0:
-            self.proxy_stream = await asyncio.create_subprocess_exec(
+            self._proxy_restart = False
+            self.proxy_stream = await self._spawn(
+                'proxy',
                 *(['ffmpeg', '-i', 'pipe:'] + self.ffmpeg_out),
                 stdin=self.proxy_reader,
                 stdout=subprocess.DEVNULL,
@@ -175,36 +374,53 @@ class Camera(Device):
 
             exit_code = await self.proxy_stream.wait()
 
-            if exit_code > 0:
+            if self._proxy_restart:
+                # Terminated by _restart_proxy_stream, start with new settings
+                exit_code = 1
+            elif exit_code > 0:
                 logging.warning(
                     f"Proxy stream for {self.name} exited unexpectedly "
                     f"with code {exit_code}. Restarting..."
                     )
                 await asyncio.sleep(3)
 
+    def _restart_proxy_stream(self):
+        """
+        Restart proxy stream, e.g. after ffmpeg_out changed. The running
+        _start_proxy_stream loop starts it again.
+        """
+        if self.proxy_stream and self.proxy_stream.returncode is None:
+            self._proxy_restart = True
+            self.proxy_stream.terminate()
+
     async def _start_idle_stream(self):
         """
         Start idle picture, writing to the proxy stream
         """
         default_image_path = "eye.png"
+        self._idle_generation += 1
+        generation = self._idle_generation
 
         # Create video from last image if configured
-        if self.last_image_idle:
-            image_path = f"/tmp/{self.name}.jpg"
-            last_image = await download_file(
-                self._arlo.last_image, image_path
+        if self.last_image_idle and self._arlo.last_image:
+            last_image, changed = await self.http_client.fetch(
+                self._arlo.last_image, key=self.name
                 )
-            # Using last camera's thumbnail as idle stream if exists
-            if last_image:
+            # Using last camera's thumbnail as idle stream if exists,
+            # only re-encode if the thumbnail has changed
+            if last_image and (changed or not self.idle_video):
                 logging.debug(
                     f"Last image found for {self.name}, setting as idle"
                 )
-                self.idle_video = await self._create_idle_video(image_path)
+                self.idle_video = await self._create_idle_video(last_image)
 
         # Either not configured for last_image_idle, or it failed to create
         # create idle video from default image to cameras resolution
         if not self.idle_video:
-            self.idle_video = await self._create_idle_video(default_image_path)
+            default_image = await self.event_loop.run_in_executor(
+                None, self._read_file, default_image_path
+                )
+            self.idle_video = await self._create_idle_video(default_image)
 
         # Still no idle_video present, revert to default video
         if not self.idle_video:
@@ -214,7 +430,16 @@ class Camera(Device):
 
         exit_code = 1
         while exit_code > 0:
-            self.stream = await asyncio.create_subprocess_exec(
+            # Fetching and encoding take a while, the camera may have gone
+            # live or a newer idle stream may have been started meanwhile
+            if (
+                generation != self._idle_generation
+                or self.get_state() not in ['idle', 'unavailable']
+            ):
+                logging.debug(f"{self.name}: idle stream superseded")
+                return
+            self.stream = await self._spawn(
+                'idle',
                 *['ffmpeg', '-re', '-stream_loop', '-1', '-i', self.idle_video,
                   '-c:v', 'copy',
                   '-c:a', 'copy',
@@ -243,22 +468,61 @@ class Camera(Device):
         Request stream, grab it, kill idle stream and start new ffmpeg instance
         writing to proxy.
         """
-        if stream_cmd is None:
-            stream_cmd = self._arlo.get_stream
+        if stream_cmd is None and self._prewarmed:
+            # Prewarmed stream, skips (the rest of) stream setup
+            prewarmed, self._prewarmed = self._prewarmed, None
+            self._prewarm_used_at = time.monotonic()
+            self._prewarm_used.set()
+            stream = await asyncio.shield(prewarmed)
+        else:
+            if stream_cmd is None:
+                stream_cmd = self._arlo.get_stream
 
-        stream = await self.event_loop.run_in_executor(None, stream_cmd)
+            stream = await self.event_loop.run_in_executor(None, stream_cmd)
 
         if stream:
             self.stop_stream()
 
-            self.stream = await asyncio.create_subprocess_exec(
-                *['ffmpeg', '-i', stream, '-c:v', 'copy',
-                  '-c:a', 'libmp3lame', '-ar', '44100',
-                  '-bsf', 'dump_extra', '-f', 'mpegts', 'pipe:'],
-                stdin=subprocess.DEVNULL,
-                stdout=self.proxy_writer,
-                stderr=subprocess.PIPE if DEBUG else subprocess.DEVNULL
-                )
+            # Second output with keyframes sampled as jpeg, for snapshots
+            snapshot_in, snapshot_out, pass_fds = [], [], ()
+            if self.snapshot_interval:
+                snapshot_reader, snapshot_writer = os.pipe()
+                pass_fds = (snapshot_writer,)
+                # Room for a few frames, so a busy loop doesn't stall ffmpeg
+                try:
+                    fcntl.fcntl(snapshot_writer, fcntl.F_SETPIPE_SZ, 1 << 20)
+                except OSError:
+                    pass
+                snapshot_in = ['-skip_frame:v', 'nokey']
+                snapshot_out = [
+                    '-map', '0:v:0',
+                    '-vf', f"fps=1/{self.snapshot_interval}",
+                    '-c:v', 'mjpeg', '-q:v', '5',
+                    '-f', 'image2pipe', f"pipe:{snapshot_writer}"
+                    ]
+
+            try:
+                self.stream = await self._spawn(
+                    'live',
+                    *['ffmpeg', *snapshot_in, '-i', stream, '-c:v', 'copy',
+                      *self._audio_args(),
+                      '-bsf', 'dump_extra', '-f', 'mpegts', 'pipe:',
+                      *snapshot_out],
+                    stdin=subprocess.DEVNULL,
+                    stdout=self.proxy_writer,
+                    stderr=subprocess.PIPE if DEBUG else subprocess.DEVNULL,
+                    pass_fds=pass_fds
+                    )
+            except Exception:
+                if pass_fds:
+                    os.close(snapshot_reader)
+                raise
+            finally:
+                if pass_fds:
+                    os.close(snapshot_writer)
+
+            if pass_fds:
+                asyncio.create_task(self._read_snapshots(snapshot_reader))
 
             if DEBUG:
                 asyncio.create_task(
@@ -272,36 +536,183 @@ class Camera(Device):
                         f"{self.name}: resolution found: {resolution}"
                         )
                     self.resolution = resolution
+                    self.resolution_probed = True
                 else:
                     logging.warning(
                         f"{self.name}: failed to find resolution, setting "
                         f"default: {self._default_resolution}"
                         )
                     self.resolution = self._default_resolution
+
+            if not self.audio:
+                self.audio = await self._get_audio(stream)
+                logging.debug(f"{self.name}: audio found: {self.audio}")
+                # Idle video may not match source audio
+                self.idle_video = None
         else:
             logging.debug(f"{self.name}: No stream available.")
 
     async def _stream_timeout(self):
         await asyncio.sleep(self.timeout)
-        await self.set_state('idle')
+        # Only end our own stream, not someone else's. Ongoing motion
+        # schedules a new timeout when it ends.
+        if self.get_state() == 'streaming' and not self.motion:
+            await self.set_state('idle')
 
-    async def _watch_timeout(self):
-        await asyncio.sleep(self.timeout)
-        await self.set_state('idle')
-        await asyncio.sleep(self.watch_refresh_time)
-        if self._arlo.is_streaming:
-            await self.set_state('watching')
+    def _battery_level(self):
+        if self._arlo.has_batteries:
+            return self._arlo.battery_level
+        return None
+
+    def _stop_budget(self):
+        self._motion_stream = False
+        self.budget.stop()
+        if self._budget_task:
+            self._budget_task.cancel()
+            self._budget_task = None
+
+    def _budget_exhausted(self):
+        return self.budget.remaining(self._battery_level()) == 0
+
+    async def _budget_timeout(self):
+        """
+        Ends motion triggered streaming when the budget runs out
+        """
+        while self.get_state() == 'streaming':
+            remaining = self.budget.remaining(self._battery_level())
+            if remaining is None:
+                break
+            if remaining == 0:
+                logging.info(
+                    f"{self.name}: streaming budget exhausted, stopping"
+                    )
+                self._budget_task = None
+                await self.set_state('idle')
+                break
+            await asyncio.sleep(remaining)
+
+    async def _watch_liveness(self):
+        """
+        Keeps the external stream running while it is being watched.
+        Arlo keeps the stream up while our ffmpeg pulls it, so a viewer
+        leaving often goes unreported. Every watch_recheck checks, the
+        stream is taken down for watch_refresh_time to see if someone else
+        is still watching.
+        """
+        checks = 0
+        while self.get_state() == 'watching':
+            await asyncio.sleep(self.timeout)
+            if self.get_state() != 'watching':
+                return
+            checks += 1
+            if not (self._stream_alive() and self._arlo.is_streaming):
+                break
+            if self.watch_recheck and checks % self.watch_recheck == 0:
+                logging.debug(f"{self.name}: rechecking external viewer")
+                self.stop_stream()
+                await asyncio.sleep(self.watch_refresh_time)
+                if self.get_state() != 'watching':
+                    return
+                if not self._arlo.is_streaming:
+                    break
+                await self._start_stream(self._arlo.get_stream_url)
+            else:
+                self.avoided_teardowns += 1
+                logging.debug(f"{self.name}: external stream still active")
+
+        if self.get_state() == 'watching':
+            # Not cancelled by leaving watching, this task is done anyway
+            self._watch_task = None
+            await self._leave_watching()
+
+    async def _start_motion_stream(self):
+        """
+        Streams because of motion, limited by the streaming budget
+        """
+        self._motion_stream = True
+        await self.set_state('streaming')
+        if self.get_state() == 'streaming' and not self._budget_task:
+            self._budget_task = asyncio.create_task(self._budget_timeout())
+
+    async def _leave_watching(self):
+        """
+        Viewer left, continues as motion stream if motion is ongoing
+        """
+        if self.motion and not self._budget_exhausted():
+            await self._start_motion_stream()
+            if self._timeout_task:
+                self._timeout_task.cancel()
+            self._timeout_task = asyncio.create_task(self._stream_timeout())
+        else:
+            await self.set_state('idle')
+
+    def _stream_alive(self):
+        """
+        Cheap liveness probe of the current live/idle ffmpeg process
+        """
+        return self.stream is not None and self.stream.returncode is None
 
     def stop_stream(self):
         """
         Stop live or idle stream (not proxy stream)
         """
+        self._live_frame = None
         if self.stream:
             try:
                 self.stream.kill()
             except ProcessLookupError:
                 pass
 
+    async def _read_snapshots(self, fd):
+        """
+        Reads jpeg frames sampled from the live stream, keeps the latest.
+        The pipe is closed on failure, so ffmpeg gets EPIPE and drops the
+        snapshot output instead of blocking the live stream.
+        """
+        pipe = os.fdopen(fd, 'rb', 0)
+        transport = None
+        buffer = b''
+        try:
+            reader = asyncio.StreamReader()
+            transport, _ = await self.event_loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), pipe
+                )
+            while chunk := await reader.read(65536):
+                buffer += chunk
+                # Keep the last complete frame (SOI ... EOI)
+                end = buffer.rfind(b'\xff\xd9')
+                if end < 0:
+                    # No frame end in sight, don't grow without bound
+                    if len(buffer) > 1 << 24:
+                        buffer = b''
+                    continue
+                start = buffer.rfind(b'\xff\xd8', 0, end)
+                if start >= 0:
+                    self._live_frame = (
+                        time.monotonic(), buffer[start:end + 2]
+                        )
+                buffer = buffer[end + 2:]
+        except Exception as e:
+            logging.warning(f"{self.name}: snapshot reader failed: {e!r}")
+        finally:
+            if transport:
+                transport.close()
+            else:
+                pipe.close()
+
+    def _live_snapshot(self):
+        """
+        Latest frame sampled from the live stream, None if not fresh
+        """
+        if (
+            self._live_frame
+            and self.get_state() in ['streaming', 'watching']
+            and time.monotonic() - self._live_frame[0]
+            < self.snapshot_interval * 2
+        ):
+            return self._live_frame[1]
+        return None
+
     async def get_pictures(self):
         """
         Async generator, yields snapshots from pyaarlo
@@ -323,7 +734,17 @@ class Camera(Device):
     def get_status(self):
         return {
             "battery": self._arlo.battery_level,
-            "state": self.get_state()
+            "state": self.get_state(),
+            "avoided_teardowns": self.avoided_teardowns,
+            "budget": {
+                "used": round(self.budget.used()),
+                "limit": self.budget.limit(self._battery_level())
+                },
+            "processes": self.processes.get_stats(),
+            "prewarm": (
+                self.prewarmer.get_stats(self.name) if self.prewarmer
+                else None
+                )
             }
 
     async def listen_motion(self):
@@ -341,13 +762,23 @@ class Camera(Device):
         """
         match payload.strip().upper().split():
             case ['START']:
-                await self.set_state('streaming')
+                # Watching already provides a live stream
+                if self.get_state() != 'watching':
+                    # Manual stream, not limited by the motion budget
+                    self._stop_budget()
+                    await self.set_state('streaming')
             case ['STOP']:
                 await self.set_state('idle')
             case ['SNAPSHOT']:
-                await self.event_loop.run_in_executor(
-                    None, self._arlo.request_snapshot
-                    )
+                # Local snapshot from live stream, avoids cloud round-trip
+                snapshot = self._live_snapshot()
+                if snapshot:
+                    if self._listen_pictures:
+                        self.put_picture(snapshot)
+                else:
+                    await self.event_loop.run_in_executor(
+                        None, self._arlo.request_snapshot
+                        )
             case ['BRIGHTNESS', value]:
                 try:
                     value = int(value)
@@ -362,26 +793,65 @@ class Camera(Device):
                 except ValueError:
                     logging.warning(f"Invalid value for brigthness: {value}")
 
-    async def _create_idle_video(self, image_path):
+    async def reconfigure(self, changes):
+        """
+        Applies changed settings, only restarting affected pipelines
+        """
+        await super().reconfigure(changes)
+        if 'audio_mode' in changes or 'audio_modes' in changes:
+            await self._reconfigure_audio(
+                changes.get('audio_mode', self._audio_mode),
+                changes.get('audio_modes', self._audio_modes)
+                )
+        for k, v in changes.items():
+            match k:
+                case 'ffmpeg_out':
+                    self.ffmpeg_out = shlex.split(v.format(name=self.name))
+                    if self.ready.is_set():
+                        self._restart_proxy_stream()
+                case 'motion_timeout':
+                    self.timeout = v
+                case 'watch_recheck':
+                    self.watch_recheck = v
+                case 'watch_refresh_time':
+                    self.watch_refresh_time = v
+                case 'last_image_idle':
+                    self.last_image_idle = v
+                case 'stream_budget':
+                    self.budget.seconds_per_hour = v
+                case 'ffmpeg_affinity':
+                    self.ffmpeg_affinity = v
+                case 'ffmpeg_nice':
+                    self.ffmpeg_nice = v
+                case 'snapshot_interval':
+                    self.snapshot_interval = v
+                case _:
+                    pass
+
+    async def _create_idle_video(self, image):
         """
-        Creates video from still image, with the cameras resolution.
-        Reverts to default on failure.
+        Creates video from still image (bytes, piped to ffmpeg),
+        with the cameras resolution. Reverts to default on failure.
         """
         output_path = f"{self.name}-idle.mp4"
 
-        convert = await asyncio.create_subprocess_exec(
+        if not image:
+            return None
+
+        convert = await self._spawn(
+            'encode',
             *['ffmpeg',
-              '-loop', '1', '-i', image_path,
-              '-f', 'lavfi', '-i', 'anullsrc=r=16000:cl=mono',
+              '-f', 'image2pipe', '-i', 'pipe:',
+              *self._idle_audio_args(),
               '-c:v', 'libx264',
-              '-c:a', 'libmp3lame', '-ar', '44100', '-b:a', '8k',
               '-t', '5',
               '-pix_fmt', 'yuv420p', '-r', '24', '-g', '24', '-vf',
+              "loop=loop=-1:size=1,"
               f"scale={self.resolution[0]}:{self.resolution[1]}",
               '-f', 'mpegts', '-y', output_path],
-            stdin=subprocess.DEVNULL,
+            stdin=subprocess.PIPE,
             stdout=subprocess.DEVNULL,
-            stderr=subprocess.PIPE
+            stderr=subprocess.PIPE if DEBUG else subprocess.DEVNULL
             )
 
         if DEBUG:
@@ -389,17 +859,31 @@ class Camera(Device):
                 self._log_stderr(convert, 'create_idle')
                 )
 
+        try:
+            convert.stdin.write(image)
+            await convert.stdin.drain()
+            convert.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
         exit_code = await convert.wait()
         if exit_code > 0:
-            logging.warning(
-                f"{self.name}: failed to create idle video from {image_path}"
-                )
+            logging.warning(f"{self.name}: failed to create idle video")
             output_path = None
 
         return output_path
 
+    @staticmethod
+    def _read_file(path):
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
     async def _get_resolution(self, stream):
-        probe = await asyncio.create_subprocess_exec(
+        probe = await self._spawn(
+            'probe',
             *['ffprobe', '-v', 'error', '-select_streams', 'v:0',
               '-show_entries', 'stream=width,height', '-of', 'csv=p=0', stream
               ],
@@ -421,6 +905,152 @@ class Camera(Device):
 
         return result
 
+    async def _get_audio(self, stream):
+        """
+        Probes audio codec, sample rate and channels of stream.
+
+            Returns:
+                (codec, sample_rate, channels), ('none', None, None) if
+                stream has no audio, None if probe failed
+        """
+        probe = await self._spawn(
+            'probe',
+            *['ffprobe', '-v', 'error', '-select_streams', 'a:0',
+              '-show_entries', 'stream=codec_name,sample_rate,channels',
+              '-of', 'csv=p=0', stream
+              ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+            )
+        stdout, _ = await probe.communicate()
+
+        if probe.returncode != 0:
+            return None
+
+        match = re.search(
+            r"(\w+),(\d+),(\d+)", stdout.decode(errors='ignore')
+            )
+        if match:
+            return match.groups()
+        return ('none', None, None)
+
+    def _resolve_audio_mode(self, audio_mode, audio_modes):
+        """
+        Audio policy for this camera, falls back to transcode if invalid
+        """
+        mode = audio_modes.get(self.name, audio_mode)
+        if mode not in self.AUDIO_MODES:
+            logging.warning(
+                f"{self.name}: invalid audio mode {mode}, using transcode"
+                )
+            mode = 'transcode'
+        return mode
+
+    async def _reconfigure_audio(self, audio_mode, audio_modes):
+        """
+        Changes audio policy, recreates idle video to match
+        """
+        self._audio_mode, self._audio_modes = audio_mode, audio_modes
+        mode = self._resolve_audio_mode(audio_mode, audio_modes)
+        if mode == self.audio_mode:
+            return
+        self.audio_mode = mode
+        self.idle_video = None
+        if self.get_state() in ['idle', 'unavailable']:
+            self.stop_stream()
+            asyncio.create_task(self._start_idle_stream())
+
+    def _effective_audio_mode(self):
+        """
+        Audio mode applied to live and idle stream. Copy needs a known
+        source codec, otherwise both fall back to transcode.
+        """
+        codec = self.audio[0] if self.audio else None
+        if self.audio_mode == 'copy' and codec != 'none' \
+                and codec not in self.AUDIO_ENCODERS:
+            return 'transcode'
+        return self.audio_mode
+
+    def _audio_layout(self):
+        """
+        Sample rate and channels of the audio in live and idle stream.
+        Copied audio keeps the source layout, transcoded audio is pinned
+        to it (or a default if unknown), so switching streams never
+        changes the layout.
+        """
+        _, sample_rate, channels = self.audio or (None, None, None)
+        if self._effective_audio_mode() == 'transcode':
+            sample_rate = '44100'
+        return sample_rate or '44100', channels or '1'
+
+    def _audio_args(self):
+        """
+        ffmpeg audio output arguments of the live stream
+        """
+        codec = self.audio[0] if self.audio else None
+        sample_rate, channels = self._audio_layout()
+        match self._effective_audio_mode():
+            case 'copy':
+                return ['-c:a', 'copy']
+            case 'aac' if codec == 'aac':
+                return ['-c:a', 'copy']
+            case 'aac':
+                return ['-c:a', 'aac', '-ar', sample_rate, '-ac', channels]
+            case 'drop':
+                return ['-an']
+            case _:
+                return ['-c:a', 'libmp3lame',
+                        '-ar', sample_rate, '-ac', channels]
+
+    def _idle_audio_args(self):
+        """
+        ffmpeg input and audio output arguments of the idle video,
+        silence matching the live stream's audio layout
+        """
+        codec = self.audio[0] if self.audio else None
+        mode = self._effective_audio_mode()
+        # Live stream has no audio when the source has none
+        if mode == 'drop' or codec == 'none':
+            return ['-an']
+        sample_rate, channels = self._audio_layout()
+        match mode:
+            case 'copy':
+                args = ['-c:a', self.AUDIO_ENCODERS[codec]]
+            case 'aac':
+                args = ['-c:a', 'aac']
+            case _:
+                args = ['-c:a', 'libmp3lame', '-b:a', '8k']
+        return ['-f', 'lavfi', '-i', 'anullsrc=r=16000:cl=mono'] + args \
+            + ['-ar', sample_rate, '-ac', channels]
+
+    async def _spawn(self, role, *args, **kwargs):
+        """
+        Starts child process with cpu affinity and nice level of its role
+        applied before exec (through taskset and nice), and tracks its
+        resource usage.
+        """
+        if role in self.ffmpeg_nice:
+            args = ('nice', '-n', str(self.ffmpeg_nice[role])) + args
+        if role in self.ffmpeg_affinity:
+            cpus = ','.join(str(c) for c in sorted(self.ffmpeg_affinity[role]))
+            args = ('taskset', '-c', cpus) + args
+        process = await asyncio.create_subprocess_exec(*args, **kwargs)
+        asyncio.create_task(self.processes.watch(role, process))
+        return process
+
+    async def _resource_monitor(self):
+        """
+        Periodically samples and logs resource usage of children
+        """
+        while True:
+            await asyncio.sleep(self.resource_interval)
+            stats = self.processes.sample()
+            logging.info(f"{self.name} processes: " + ", ".join(
+                f"{role} cpu {s['cpu_percent']}% "
+                f"(total {s['cpu_total']}s) rss {s['rss_mb']}MB"
+                for role, s in stats.items()
+                ))
+
     async def _log_stderr(self, stream, label):
         """
         Continuously read from stderr and log the output.
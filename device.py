@@ -57,6 +57,13 @@ class Device(object):
     async def mqtt_control(self, payload):
         pass
 
+    async def reconfigure(self, changes):
+        """
+        Applies changed settings (from config reload)
+        """
+        if 'status_interval' in changes:
+            self.status_interval = changes['status_interval']
+
     def create_sync_async_channel(self):
         """
         Sync/Async channel
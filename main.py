@@ -1,10 +1,18 @@
-from decouple import config
+from decouple import config, AutoConfig, RepositoryEnv
 import pyaarlo
 import asyncio
 import logging
 import signal
+import json
+import time
+import os
 from camera import Camera
 from base import Base
+from utils import HttpClient, FileConfig, parse_cpus, parse_role_map
+from monitor import LoopMonitor, install_loop
+from prewarm import Prewarmer
+
+START_TIME = time.monotonic()
 
 # Read config from ENV
 ARLO_USER = config('ARLO_USER')
@@ -14,19 +22,26 @@ IMAP_USER = config('IMAP_USER')
 IMAP_PASS = config('IMAP_PASS')
 IMAP_GRAB_ALL = config('IMAP_GRAB_ALL', default=False, cast=bool)
 IMAP_DELETE_AFTER = config('IMAP_DELETE_AFTER', default=False, cast=bool)
-MQTT_BROKER = config('MQTT_BROKER', default=None)
-FFMPEG_OUT = config('FFMPEG_OUT')
+API_PORT = config('API_PORT', default=None)
 DEFAULT_RESOLUTION = config('DEFAULT_RESOLUTION', default=(1280, 768))
-MOTION_TIMEOUT = config('MOTION_TIMEOUT', default=60, cast=int)
-STATUS_INTERVAL = config('STATUS_INTERVAL', default=120, cast=int)
-LAST_IMAGE_IDLE = config('LAST_IMAGE_IDLE', default=False, cast=bool)
-WATCH_REFRESH_TIME = config('WATCH_REFRESH_TIME', default=2, cast=int)
 DEBUG = config('DEBUG', default=False, cast=bool)
 PYAARLO_BACKEND = config('PYAARLO_BACKEND', default=None)
 PYAARLO_REFRESH_DEVICES = config('PYAARLO_REFRESH_DEVICES', default=0, cast=int)
 PYAARLO_STREAM_TIMEOUT = config('PYAARLO_STREAM_TIMEOUT', default=0, cast=int)
 PYAARLO_STORAGE_DIR = config('PYAARLO_STORAGE_DIR', default=None)
 PYAARLO_ECDH_CURVE = config('PYAARLO_ECDH_CURVE', default=None)
+PYAARLO_SAVE_SESSION = config('PYAARLO_SAVE_SESSION', default=True, cast=bool)
+HTTP_TIMEOUT = config('HTTP_TIMEOUT', default=10, cast=int)
+RESOURCE_INTERVAL = config('RESOURCE_INTERVAL', default=60, cast=int)
+PREWARM_ADJACENCY = config('PREWARM_ADJACENCY', default='')
+PREWARM_TTL = config('PREWARM_TTL', default=20, cast=int)
+PREWARM_MAX = config('PREWARM_MAX', default=2, cast=int)
+STATE_FILE = config('STATE_FILE', default='arlo-streamer-state.json')
+CONFIG_FILE = config('CONFIG_FILE', default=None)
+LOOP_IMPL = config('LOOP_IMPL', default='asyncio')
+LOOP_MONITOR = config('LOOP_MONITOR', default=True, cast=bool)
+LOOP_MONITOR_INTERVAL = config('LOOP_MONITOR_INTERVAL', default=300, cast=int)
+LOOP_SLOW_CALLBACK = config('LOOP_SLOW_CALLBACK', default=100, cast=int)
 
 # Initialize logging
 logging.basicConfig(
@@ -35,9 +50,145 @@ logging.basicConfig(
     )
 
 shutdown_event = asyncio.Event()
+reload_event = asyncio.Event()
+
+
+def read_config():
+    """
+    Config for reloadable settings. Values in CONFIG_FILE take precedence
+    over the environment, without it .env is read (environment first).
+    """
+    if CONFIG_FILE:
+        return FileConfig(RepositoryEnv(CONFIG_FILE))
+    return AutoConfig(search_path=os.path.dirname(__file__) or '.')
+
+
+def device_settings(conf):
+    """
+    Settings passed to devices as keywords, these can be changed with SIGHUP
+    """
+    return {
+        'ffmpeg_out': conf('FFMPEG_OUT'),
+        'motion_timeout': conf('MOTION_TIMEOUT', default=60, cast=int),
+        'status_interval': conf('STATUS_INTERVAL', default=120, cast=int),
+        'last_image_idle': conf('LAST_IMAGE_IDLE', default=False, cast=bool),
+        'watch_recheck': conf('WATCH_RECHECK', default=5, cast=int),
+        'watch_refresh_time': conf('WATCH_REFRESH_TIME', default=2, cast=int),
+        'stream_budget': conf('STREAM_BUDGET', default=0, cast=int),
+        'ffmpeg_affinity': parse_role_map(
+            conf('FFMPEG_AFFINITY', default=''), cast=parse_cpus
+            ),
+        'ffmpeg_nice': parse_role_map(
+            conf('FFMPEG_NICE', default=''), cast=int
+            ),
+        'audio_mode': conf('AUDIO_MODE', default='transcode'),
+        'audio_modes': parse_role_map(conf('AUDIO_MODE_CAMERAS', default='')),
+        'snapshot_interval': conf('SNAPSHOT_INTERVAL', default=5, cast=int)
+    }
+
+
+def load_state():
+    """
+    Load state persisted between restarts (probed resolution and audio)
+    """
+    try:
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(cameras):
+    state = {
+        # Default resolution is not saved, so a failed probe is retried
+        'resolutions': {
+            c.name: c.resolution for c in cameras if c.resolution_probed
+            },
+        'audio': {c.name: c.audio for c in cameras if c.audio}
+        }
+    try:
+        with open(STATE_FILE, 'w') as f:
+            json.dump(state, f)
+    except OSError as e:
+        logging.warning(f"Failed to save state to {STATE_FILE}: {e}")
+
+
+async def report_startup(cameras):
+    """
+    Logs restart-to-streaming time for each camera, persists state as
+    each camera becomes ready, so an offline camera doesn't hold it back
+    """
+    ready = asyncio.as_completed([c.ready.wait() for c in cameras])
+    for i, camera_ready in enumerate(ready, 1):
+        await camera_ready
+        elapsed = time.monotonic() - START_TIME
+        logging.info(
+            f"Restart-to-streaming: {i}/{len(cameras)} cameras "
+            f"ready after {elapsed:.1f}s"
+            )
+        await asyncio.get_running_loop().run_in_executor(
+            None, save_state, cameras
+            )
+
+
+async def reload_service(cameras, bases, settings):
+    """
+    Re-reads config on SIGHUP, reconfigures only what changed
+    """
+    mqtt_task = None
+    mqtt_settings = None
+    conf = read_config()
+
+    while True:
+        # (Re)start mqtt service
+        mqtt_broker = conf('MQTT_BROKER', default=None)
+        if mqtt_broker and not mqtt_task:
+            import mqtt
+            mqtt.reload(conf)
+            mqtt_task = asyncio.create_task(mqtt.mqtt_client(cameras, bases))
+            mqtt_settings = mqtt.settings()
+
+        await reload_event.wait()
+        reload_event.clear()
+        logging.info('Reloading config...')
+
+        try:
+            new_conf = read_config()
+            new_settings = device_settings(new_conf)
+            if new_conf('MQTT_BROKER', default=None):
+                import mqtt
+                mqtt.reload(new_conf)
+        except Exception as e:
+            logging.warning(f"Invalid config, reload ignored: {e}")
+            continue
+        conf = new_conf
+
+        changes = {
+            k: v for k, v in new_settings.items() if settings[k] != v
+            }
+        settings = new_settings
+        if changes:
+            logging.info(f"Changed settings: {', '.join(changes)}")
+            for d in cameras + bases:
+                await d.reconfigure(changes)
+
+        if mqtt_task and (
+            not conf('MQTT_BROKER', default=None)
+            or mqtt.settings() != mqtt_settings
+        ):
+            logging.info('MQTT settings changed, restarting client')
+            mqtt_task.cancel()
+            mqtt_task = None
 
 
 async def main():
+    # Monitor event loop health
+    if LOOP_MONITOR:
+        asyncio.create_task(LoopMonitor(
+            report_interval=LOOP_MONITOR_INTERVAL,
+            slow_callback=LOOP_SLOW_CALLBACK / 1000
+            ).run())
+
     # login to arlo with 2FA
     arlo_args = {
         'username': ARLO_USER,
@@ -66,33 +217,74 @@ async def main():
     if PYAARLO_ECDH_CURVE:
         arlo_args['ecdh_curve'] = PYAARLO_ECDH_CURVE
 
+    # Reuse authenticated session across restarts
+    arlo_args['save_session'] = PYAARLO_SAVE_SESSION
+
     arlo = pyaarlo.PyArlo(**arlo_args)
 
+    settings = device_settings(read_config())
+
     # Initialize bases
-    bases = [Base(b, STATUS_INTERVAL) for b in arlo.base_stations]
+    bases = [Base(b, settings['status_interval'])
+             for b in arlo.base_stations]
+
+    # Shared http client
+    http_client = HttpClient(HTTP_TIMEOUT)
+
+    # Prewarm streams of adjacent cameras on motion
+    adjacency = parse_role_map(
+        PREWARM_ADJACENCY, cast=lambda v: [n.strip() for n in v.split(',')]
+        )
+    prewarmer = Prewarmer(adjacency, PREWARM_TTL, PREWARM_MAX) \
+        if adjacency else None
 
     # Initialize cameras
     cameras = [Camera(
-        c, FFMPEG_OUT, MOTION_TIMEOUT, STATUS_INTERVAL, LAST_IMAGE_IDLE,
-        DEFAULT_RESOLUTION, WATCH_REFRESH_TIME
+        c, **settings,
+        default_resolution=DEFAULT_RESOLUTION,
+        resource_interval=RESOURCE_INTERVAL,
+        http_client=http_client,
+        prewarmer=prewarmer
         ) for c in arlo.cameras]
 
+    if prewarmer:
+        [prewarmer.add(c) for c in cameras]
+
+    # Skip probing cameras with known resolution and audio
+    state = load_state()
+    for c in cameras:
+        if c.name in state.get('resolutions', {}):
+            c.resolution = tuple(state['resolutions'][c.name])
+            c.resolution_probed = True
+        # Audio saved without channels is probed again
+        if len(state.get('audio', {}).get(c.name, [])) == 3:
+            c.audio = tuple(state['audio'][c.name])
+
     # Start both
     [asyncio.create_task(d.run()) for d in cameras + bases]
+    asyncio.create_task(report_startup(cameras))
+
+    # Initialize mqtt service and config reloading
+    asyncio.create_task(reload_service(cameras, bases, settings))
 
-    # Initialize mqtt service
-    if MQTT_BROKER:
-        import mqtt
-        asyncio.create_task(mqtt.mqtt_client(cameras, bases))
+    # Initialize http api
+    if API_PORT:
+        import api
+        asyncio.create_task(api.api_server(cameras, bases))
 
     # Graceful shutdown
     def request_shutdown(signal, frame):
         logging.info('Shutdown requested...')
         shutdown_event.set()
 
-    # Register callbacks for shutdown
+    def request_reload(signal, frame):
+        logging.info('Reload requested...')
+        reload_event.set()
+
+    # Register callbacks for shutdown and reload
     signal.signal(signal.SIGTERM, request_shutdown)
     signal.signal(signal.SIGINT, request_shutdown)
+    signal.signal(signal.SIGHUP, request_reload)
 
     # Wait for shutdown
     await shutdown_event.wait()
@@ -101,9 +293,13 @@ async def main():
     for c in cameras:
         c.shutdown(signal)
 
-    arlo.stop(logout=True)
+    save_state(cameras)
+    await http_client.close()
+    # Keep session valid for next start if saved
+    arlo.stop(logout=not PYAARLO_SAVE_SESSION)
 
 # Run main
+logging.info(f"Event loop: {install_loop(LOOP_IMPL)}")
 try:
     asyncio.run(main())
 except RuntimeError:
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import statistics
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+
+class LoopMonitor(object):
+    """
+    Measures event loop scheduling delay, and logs callbacks blocking
+    the loop together with the task responsible.
+
+    Attributes
+    ----------
+    interval: float
+        time between lag samples (seconds)
+    report_interval: int
+        time between logged lag percentiles (seconds)
+    slow_callback: float
+        blocking time before a callback is logged as slow (seconds)
+    """
+
+    def __init__(self, interval=0.1, report_interval=60, slow_callback=0.1,
+                 samples=1000):
+        self.interval = interval
+        self.report_interval = report_interval
+        self.slow_callback = slow_callback
+        self.lags = deque(maxlen=samples)
+        self.slow_callbacks = 0
+        self._heartbeat = time.monotonic()
+        self._loop = None
+        self._loop_thread = None
+        self._stopped = threading.Event()
+
+    async def run(self):
+        """
+        Samples loop lag, starts watchdog thread and reports periodically
+        """
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        threading.Thread(
+            target=self._watchdog, name='loop-watchdog', daemon=True
+            ).start()
+        report = asyncio.create_task(self._report())
+
+        try:
+            while not self._stopped.is_set():
+                start = time.monotonic()
+                await asyncio.sleep(self.interval)
+                self._heartbeat = time.monotonic()
+                self.lags.append(self._heartbeat - start - self.interval)
+        finally:
+            self._stopped.set()
+            report.cancel()
+
+    def stop(self):
+        """
+        Stops sampling, reporting and the watchdog thread
+        """
+        self._stopped.set()
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            stats = self.get_stats()
+            if stats:
+                logging.info(
+                    "Loop lag (ms): " + ", ".join(
+                        f"{k} {v}" for k, v in stats.items()
+                        )
+                    )
+
+    def get_stats(self):
+        """
+        Lag percentiles of collected samples (milliseconds)
+        """
+        if len(self.lags) < 2:
+            return {}
+        q = statistics.quantiles(self.lags, n=100, method='inclusive')
+        return {
+            'p50': round(q[49] * 1000, 1),
+            'p95': round(q[94] * 1000, 1),
+            'p99': round(q[98] * 1000, 1),
+            'max': round(max(self.lags) * 1000, 1),
+            'slow_callbacks': self.slow_callbacks
+            }
+
+    def _watchdog(self):
+        """
+        Runs in separate thread, logs what the loop thread is executing
+        when it has not ticked for slow_callback seconds.
+        """
+        reported = None
+        while not self._stopped.wait(self.slow_callback / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.slow_callback or heartbeat == reported:
+                continue
+            reported = heartbeat
+            self.slow_callbacks += 1
+
+            frame = sys._current_frames().get(self._loop_thread)
+            task = asyncio.current_task(self._loop)
+            coro = task.get_coro().__qualname__ if task else None
+            stack = ''.join(traceback.format_stack(frame, limit=3)) \
+                if frame else ''
+            logging.warning(
+                f"Event loop blocked for over {stalled * 1000:.0f} ms "
+                f"in {coro or 'callback'}\n{stack.rstrip()}"
+                )
+
+
+def install_loop(loop_impl):
+    """
+    Installs alternative event loop implementation if available.
+
+        Returns:
+            name of the loop implementation in use
+    """
+    if loop_impl == 'uvloop':
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            return 'uvloop'
+        except ImportError:
+            logging.warning("uvloop not installed, using asyncio loop")
+    return 'asyncio'
@@ -8,17 +8,40 @@ import asyncio
 import time
 
 DEBUG = config('DEBUG', default=False, cast=bool)
-MQTT_BROKER = config('MQTT_BROKER')
-MQTT_PORT = config('MQTT_PORT', cast=int, default=1883)
-MQTT_USER = config('MQTT_USER', default=None)
-MQTT_PASS = config('MQTT_PASS', default=None)
-MQTT_RECONNECT_INTERVAL = config('MQTT_RECONNECT_INTERVAL', default=5)
-MQTT_TOPIC_PICTURE = config('MQTT_TOPIC_PICTURE', default='arlo/picture')
-# MQTT_TOPIC_LOCATION = config('MQTT_TOPIC_LOCATION', default='arlo/location')
-MQTT_TOPIC_CONTROL = config('MQTT_TOPIC_CONTROL',
-                            default='arlo/control/{name}')
-MQTT_TOPIC_STATUS = config('MQTT_TOPIC_STATUS', default='arlo/status/{name}')
-MQTT_TOPIC_MOTION = config('MQTT_TOPIC_MOTION', default='arlo/motion/{name}')
+
+
+def reload(conf=config):
+    """
+    (Re)reads mqtt config, takes effect on next connect
+    """
+    global MQTT_BROKER, MQTT_PORT, MQTT_USER, MQTT_PASS
+    global MQTT_RECONNECT_INTERVAL, MQTT_TOPIC_PICTURE, MQTT_TOPIC_CONTROL
+    global MQTT_TOPIC_STATUS, MQTT_TOPIC_MOTION
+    # Read everything before assigning, so an invalid value changes nothing
+    values = (
+        conf('MQTT_BROKER', default=None),
+        conf('MQTT_PORT', cast=int, default=1883),
+        conf('MQTT_USER', default=None),
+        conf('MQTT_PASS', default=None),
+        conf('MQTT_RECONNECT_INTERVAL', default=5),
+        conf('MQTT_TOPIC_PICTURE', default='arlo/picture'),
+        # conf('MQTT_TOPIC_LOCATION', default='arlo/location'),
+        conf('MQTT_TOPIC_CONTROL', default='arlo/control/{name}'),
+        conf('MQTT_TOPIC_STATUS', default='arlo/status/{name}'),
+        conf('MQTT_TOPIC_MOTION', default='arlo/motion/{name}')
+        )
+    (MQTT_BROKER, MQTT_PORT, MQTT_USER, MQTT_PASS, MQTT_RECONNECT_INTERVAL,
+     MQTT_TOPIC_PICTURE, MQTT_TOPIC_CONTROL, MQTT_TOPIC_STATUS,
+     MQTT_TOPIC_MOTION) = values
+
+
+def settings():
+    return (MQTT_BROKER, MQTT_PORT, MQTT_USER, MQTT_PASS,
+            MQTT_RECONNECT_INTERVAL, MQTT_TOPIC_PICTURE, MQTT_TOPIC_CONTROL,
+            MQTT_TOPIC_STATUS, MQTT_TOPIC_MOTION)
+
+
+reload()
 
 logging.basicConfig(
     level=logging.DEBUG if DEBUG else logging.INFO,
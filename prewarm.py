@@ -0,0 +1,74 @@
+import asyncio
+import logging
+
+
+class Prewarmer(object):
+    """
+    Speculatively requests streams of cameras adjacent to a camera
+    detecting motion, so their stream is ready if motion follows.
+
+    Attributes
+    ----------
+    adjacency: dict
+        camera name -> list of neighbouring camera names
+    ttl: int
+        how long a prewarmed stream is held before release (seconds)
+    max_concurrent: int
+        max number of prewarmed streams held at once
+    """
+
+    def __init__(self, adjacency, ttl, max_concurrent):
+        self.adjacency = adjacency
+        self.ttl = ttl
+        self.max_concurrent = max_concurrent
+        self.cameras = {}
+        self._active = set()
+        self._stats = {}
+
+    def add(self, camera):
+        self.cameras[camera.name] = camera
+        self._stats[camera.name] = {
+            'prewarms': 0, 'hits': 0, 'misses': 0, 'skipped': 0,
+            'saved_seconds': 0.0
+            }
+
+    def on_motion(self, camera):
+        """
+        Prewarms neighbours of camera, up to max_concurrent
+        """
+        for name in self.adjacency.get(camera.name, []):
+            neighbour = self.cameras.get(name)
+            if not neighbour or name in self._active:
+                continue
+            if not neighbour.can_prewarm():
+                continue
+            if len(self._active) >= self.max_concurrent:
+                self._stats[name]['skipped'] += 1
+                continue
+            self._active.add(name)
+            asyncio.create_task(self._prewarm(neighbour))
+
+    async def _prewarm(self, camera):
+        stats = self._stats[camera.name]
+        try:
+            stats['prewarms'] += 1
+            result = await camera.prewarm(self.ttl)
+            if result is None:
+                return
+            hit, setup_time = result
+            if hit:
+                stats['hits'] += 1
+                stats['saved_seconds'] = round(
+                    stats['saved_seconds'] + setup_time, 1
+                    )
+            else:
+                stats['misses'] += 1
+            logging.info(
+                f"{camera.name} prewarm {'hit' if hit else 'miss'}, "
+                f"hits: {stats['hits']}, misses: {stats['misses']}"
+                )
+        finally:
+            self._active.discard(camera.name)
+
+    def get_stats(self, name):
+        return self._stats.get(name)
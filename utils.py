@@ -1,17 +1,284 @@
 import aiohttp
+import asyncio
+import logging
+import time
+import os
+from decouple import Config, Undefined, UndefinedValueError, undefined
 
 
-async def download_file(url, dest_filename):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status == 200:
-                # Read file data
-                with open(dest_filename, 'wb') as f:
-                    while True:
-                        chunk = await response.content.read(1024)
-                        if not chunk:
-                            break
-                        f.write(chunk)
-                return True
-            else:
-                return False
+class HttpClient(object):
+    """
+    Shared, long-lived HTTP client. Keeps connections alive between
+    requests and remembers ETag/Last-Modified per key, so unchanged
+    resources are not downloaded again.
+
+    Attributes
+    ----------
+    timeout: int
+        total timeout of a single request (seconds)
+    keepalive: int
+        how long idle connections are kept open (seconds)
+    """
+
+    def __init__(self, timeout=10, keepalive=60):
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self._session = None
+        self._cache = {}
+
+    def _get_session(self):
+        # Created lazily, session must be bound to the running loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    keepalive_timeout=self.keepalive
+                    ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+                )
+        return self._session
+
+    async def fetch(self, url, key=None):
+        """
+        Conditional GET of url, validators are stored under key
+        (defaults to url).
+
+            Returns:
+                (data, changed): data is the body (cached if unchanged),
+                None on failure. changed is False if the body is unchanged
+                since the last fetch of key.
+        """
+        key = key or url
+        cached = self._cache.get(key)
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        try:
+            async with self._get_session().get(
+                url, headers=headers
+            ) as response:
+                if response.status == 304 and cached:
+                    return cached['data'], False
+                if response.status != 200:
+                    return None, False
+                data = await response.read()
+                changed = not cached or cached['data'] != data
+                self._cache[key] = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'data': data
+                    }
+                return data, changed
+        except (aiohttp.ClientError, TimeoutError) as e:
+            logging.debug(f"HTTP request failed for {key}: {e!r}")
+            return None, False
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+
+class StreamBudget(object):
+    """
+    Rolling window accounting of live streaming time.
+
+    Attributes
+    ----------
+    seconds_per_hour: int
+        max live seconds per hour at full battery (0 disables the budget)
+    """
+
+    WINDOW = 3600
+
+    def __init__(self, seconds_per_hour):
+        self.seconds_per_hour = seconds_per_hour
+        self._spans = []
+        self._started = None
+
+    def start(self):
+        if self._started is None:
+            self._started = time.monotonic()
+
+    def stop(self):
+        if self._started is not None:
+            self._spans.append((self._started, time.monotonic()))
+            self._started = None
+
+    def used(self):
+        """
+        Seconds streamed within the last hour, including a running stream
+        """
+        now = time.monotonic()
+        window_start = now - self.WINDOW
+        self._spans = [s for s in self._spans if s[1] > window_start]
+        spans = self._spans + (
+            [(self._started, now)] if self._started is not None else []
+            )
+        return sum(end - max(start, window_start) for start, end in spans)
+
+    def limit(self, battery_level=None):
+        """
+        Budget scaled by battery level (percent), None if unlimited
+        """
+        if not self.seconds_per_hour:
+            return None
+        if battery_level is None:
+            return self.seconds_per_hour
+        return self.seconds_per_hour * max(0, min(battery_level, 100)) / 100
+
+    def remaining(self, battery_level=None):
+        limit = self.limit(battery_level)
+        if limit is None:
+            return None
+        return max(0, limit - self.used())
+
+
+class FileConfig(Config):
+    """
+    Config where values in the file take precedence over the environment,
+    so a changed file is picked up even if the same variable was set in
+    the environment at startup. Options missing from the file fall back to
+    the environment.
+    """
+
+    def get(self, option, default=undefined, cast=undefined):
+        if option in self.repository.data:
+            value = self.repository.data[option]
+        elif option in os.environ:
+            value = os.environ[option]
+        elif isinstance(default, Undefined):
+            raise UndefinedValueError(
+                f"{option} not found. Declare it as envvar or define a "
+                "default value."
+                )
+        else:
+            value = default
+
+        if isinstance(cast, Undefined):
+            cast = self._cast_do_nothing
+        elif cast is bool:
+            cast = self._cast_boolean
+        return cast(value)
+
+
+def parse_cpus(cpus):
+    """
+    Parses cpu list, e.g. "0,2-3" -> {0, 2, 3}
+    """
+    result = set()
+    for part in cpus.split(','):
+        start, _, end = part.strip().partition('-')
+        result.update(range(int(start), int(end or start) + 1))
+    return result
+
+
+def parse_role_map(value, cast=str):
+    """
+    Parses per role setting, e.g. "encode=10;idle=5" -> {'encode': 10, ...}
+    """
+    result = {}
+    for item in filter(None, (i.strip() for i in value.split(';'))):
+        role, _, setting = item.partition('=')
+        result[role.strip()] = cast(setting.strip())
+    return result
+
+
+def read_proc_stats(pid):
+    """
+    Reads cpu time (seconds) and rss (bytes) of process from /proc.
+
+        Returns:
+            (cpu, rss), or None if process is gone or /proc unavailable
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Skip past command name, it may contain spaces
+    fields = stat[stat.rindex(')') + 2:].split()
+    utime, stime, rss = int(fields[11]), int(fields[12]), int(fields[21])
+    return (
+        (utime + stime) / os.sysconf('SC_CLK_TCK'),
+        rss * os.sysconf('SC_PAGE_SIZE')
+        )
+
+
+class ProcessAccounting(object):
+    """
+    Per role cpu and memory accounting of child processes. Each process is
+    polled while it runs, quickly at first, so the cpu time of short-lived
+    processes is recorded up to their exit and kept in the role total.
+
+    Attributes
+    ----------
+    poll_interval: float
+        max time between polls of a running process (seconds)
+    """
+
+    def __init__(self, poll_interval=0.5):
+        self.poll_interval = poll_interval
+        self.roles = {}
+
+    def _entry(self, role):
+        return self.roles.setdefault(role, {
+            'exited_cpu': 0.0, 'running': {}, 'cpu_percent': 0.0,
+            'reported_cpu': 0.0, 'reported_at': time.monotonic()
+            })
+
+    async def watch(self, role, process):
+        """
+        Polls cpu and memory of process until it exits
+        """
+        entry = self._entry(role)
+        exited = asyncio.ensure_future(process.wait())
+        interval = 0.05
+        cpu = 0.0
+        while True:
+            stats = read_proc_stats(process.pid)
+            # Cpu time never decreases, anything else is a reused pid
+            if stats and stats[0] >= cpu:
+                cpu = stats[0]
+                entry['running'][process.pid] = stats
+            done, _ = await asyncio.wait({exited}, timeout=interval)
+            if done:
+                break
+            interval = min(interval * 2, self.poll_interval)
+        entry['running'].pop(process.pid, None)
+        entry['exited_cpu'] += cpu
+
+    @staticmethod
+    def _cpu_total(entry):
+        return entry['exited_cpu'] + sum(
+            cpu for cpu, _ in entry['running'].values()
+            )
+
+    def sample(self):
+        """
+        Updates cpu usage since the last sample, returns stats per role
+        """
+        now = time.monotonic()
+        for entry in self.roles.values():
+            cpu = self._cpu_total(entry)
+            elapsed = now - entry['reported_at']
+            if elapsed > 0:
+                entry['cpu_percent'] = round(
+                    (cpu - entry['reported_cpu']) / elapsed * 100, 1
+                    )
+            entry.update(reported_cpu=cpu, reported_at=now)
+        return self.get_stats()
+
+    def get_stats(self):
+        return {
+            role: {
+                'cpu_total': round(self._cpu_total(e), 1),
+                'cpu_percent': e['cpu_percent'],
+                'rss_mb': round(
+                    sum(rss for _, rss in e['running'].values()) / 2**20, 1
+                    )
+                }
+            for role, e in self.roles.items()
+            }